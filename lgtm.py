@@ -1,91 +1,500 @@
 #!/usr/bin/env python3
 
-import argparse
-import json
+import functools
+import os
+import re
 import subprocess
+import sys
+import threading
+import types
+
+try:
+    import orjson as json
+except ImportError:
+    import json
+
+
+CACHE_DIR=os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'lgtmcli')
+ETAG_CACHE=os.path.join(CACHE_DIR, 'etags')
+
+# seconds to wait on any git/gh subprocess or api request before giving up, unless LGTM_GH_TIMEOUT overrides it
+GH_TIMEOUT=30
+
+# matches git@github.com:org/repo.git, ssh host aliases like git@github.com-work:org/repo.git,
+# ssh://git@github.com[:22]/org/repo and https://[user@]github.com/org/repo/
+REMOTE_PATTERN=re.compile(r'(?:^|[@/])github\.com(?:-[\w.-]+)?(?::\d+)?[:/]([^/]+?)/([^/]+?)(?:\.git)?/?$')
+
+# a line or range of lines, eg. 5, 5-12 or 5:12
+LINE_RANGE_PATTERN=re.compile(r'^(\d+)(?:[-:](\d+))?$')
+
+# the next page in a `Link: <https://api.github.com/...>; rel="next"` header
+NEXT_LINK_PATTERN=re.compile(r'<https://api\.github\.com(/[^>]*)>;\s*rel="next"')
+
+# flags understood by parse_args, mirroring build_parser
+OPTIONS={'-p': 'pr', '--pr': 'pr', '-F': 'file', '--file': 'file', '-l': 'line', '--line': 'line', '-c': 'comment', '--comment': 'comment'}
+SWITCHES={
+    '-v': ('view', True), '--view': ('view', True), '--no-view': ('view', False),
+    '-e': ('edit', True), '--edit': ('edit', True), '--no-edit': ('edit', False),
+    '-a': ('approve', True), '--approve': ('approve', True), '--no-approve': ('approve', False),
+}
+
+# pairs of arguments that cannot be set together
+EXCLUSIVE_ARGS=[('view', 'comment'), ('view', 'edit'), ('view', 'approve'), ('edit', 'comment'), ('edit', 'approve')]
+
+REVIEW_COMMENTS_QUERY='''
+query($owner: String!, $repo: String!, $pr: Int!, $cursor: String) {
+  repository(owner: $owner, name: $repo) {
+    pullRequest(number: $pr) {
+      reviewThreads(first: 100, after: $cursor) {
+        pageInfo { hasNextPage endCursor }
+        nodes {
+          id
+          comments(first: 100) {
+            pageInfo { hasNextPage endCursor }
+            nodes { databaseId body path line replyTo { databaseId } }
+          }
+        }
+      }
+    }
+  }
+}
+'''
+
+# the rest of a review thread with more comments than fit in REVIEW_COMMENTS_QUERY
+THREAD_COMMENTS_QUERY='''
+query($id: ID!, $cursor: String) {
+  node(id: $id) {
+    ... on PullRequestReviewThread {
+      comments(first: 100, after: $cursor) {
+        pageInfo { hasNextPage endCursor }
+        nodes { databaseId body path line replyTo { databaseId } }
+      }
+    }
+  }
+}
+'''
+
+
+@functools.lru_cache(maxsize=None)
+def gh_timeout():
+    # read lazily so a bad value cannot break --help, and fall back rather than fail
+    value = os.environ.get('LGTM_GH_TIMEOUT')
+    if value == None:
+        return GH_TIMEOUT
+    try:
+        timeout = float(value)
+    except ValueError:
+        timeout = 0
+    if not timeout > 0:
+        print(f'Ignoring LGTM_GH_TIMEOUT={value}, expected a positive number of seconds, using {GH_TIMEOUT}', file=sys.stderr)
+        return GH_TIMEOUT
+    return timeout
+
+
+def read_command(command: list):
+    # decode straight to text and leave stderr on the terminal
+    return subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True, timeout=gh_timeout()).stdout.rstrip('\n')
 
 
 class GHApi:
-    headers=['-H', "Accept: application/vnd.github+json", '-H', "X-GitHub-Api-Version: 2022-11-28"]
-
     def __init__(self):
+        # the networking modules are only imported once a command needs the api, keeping approve and --help fast
+        import concurrent.futures
+
         # TODO load in bash script???
-        remote=subprocess.check_output(['git', 'config', '--get', 'remote.origin.url']).decode('utf-8').strip()
-        if 'git@github.com' in remote:
-            parts=remote.split(':')[1].split('/')
-            self.org=parts[0]
-            self.repo=parts[1].split('.')[0]
-        elif 'https://github.com' in remote:
-            parts=remote.split('/')
-            self.org=parts[3]
-            self.repo=parts[4].split('.')[0]
-        else:
+        # use a token from the environment the same way gh does, otherwise ask gh for it
+        token=os.environ.get('GH_TOKEN') or os.environ.get('GITHUB_TOKEN')
+
+        # the remote and token lookups are independent, so run them side by side
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            remote_future=executor.submit(read_command, ['git', 'config', '--get', 'remote.origin.url'])
+            if token == None:
+                token_future=executor.submit(read_command, ['gh', 'auth', 'token'])
+
+        remote=remote_future.result()
+        match=REMOTE_PATTERN.search(remote)
+        if match == None:
             raise Exception('Cannot parse `git config --get remote.origin.url`')
+        self.org, self.repo=match.groups()
+        self.base_path=f'/repos/{self.org}/{self.repo}/'
+
+        # authenticate once and reuse the same headers on every api call
+        if token == None:
+            token=token_future.result()
+        self.headers={
+            "Accept": "application/vnd.github+json",
+            "X-GitHub-Api-Version": "2022-11-28",
+            "User-Agent": "lgtmcli",
+            "Authorization": f"Bearer {token}",
+        }
+        self.json_headers={**self.headers, "Content-Type": "application/json"}
+        # hand the token to any gh subprocess so it skips its own config and keyring lookup
+        self.env={**os.environ, 'GH_TOKEN': token}
+        # each thread keeps its own connection so background requests run alongside the main one
+        self.local=threading.local()
+        # the etag cache is a single file, so only one thread reads or writes it at a time
+        self.lock=threading.Lock()
+
+    def connection(self):
+        import http.client
+
+        if not hasattr(self.local, 'connection'):
+            self.local.connection=http.client.HTTPSConnection('api.github.com', timeout=gh_timeout())
+        return self.local.connection
+
+    def request(self, method: str, url: str, fields=None):
+        return self.send(method, url, fields)[0]
+
+    def send(self, method: str, url: str, fields=None):
+        # returns the parsed response and the url of the next page, if any
+        import dbm
+        import http.client
+        import shelve
+
+        body=None
+        headers=self.headers
+        if fields != None:
+            body=json.dumps(fields)
+            headers=self.json_headers
+        cached=None
+        if method == 'GET':
+            # conditional requests answered with 304 do not count against the rate limit
+            # the cache is only an optimisation, so an unwritable or corrupt one just means going uncached
+            # (dbm.error is a tuple that already includes OSError)
+            with self.lock:
+                try:
+                    os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+                    with shelve.open(ETAG_CACHE) as cache:
+                        cached=cache.get(url)
+                except dbm.error:
+                    cached=None
+            if cached != None:
+                headers={**headers, "If-None-Match": cached['etag']}
+        connection=self.connection()
+        try:
+            try:
+                connection.request(method, url, body, headers)
+                response=connection.getresponse()
+            except (BrokenPipeError, ConnectionResetError, http.client.RemoteDisconnected):
+                # the server dropped the idle keep-alive connection, eg. while the user was in the editor or a prompt,
+                # so reconnect and try once more
+                connection.close()
+                connection.request(method, url, body, headers)
+                response=connection.getresponse()
+            data=response.read()
+        except BaseException:
+            # anything else, eg. a timeout, leaves the connection part way through a request,
+            # so drop it and let the next request, like the rest fallback, start on a fresh socket
+            connection.close()
+            raise
+        match=NEXT_LINK_PATTERN.search(response.getheader('Link', ''))
+        next_url=match.group(1) if match != None else None
+        if response.status == 304:
+            data=cached['body']
+            next_url=cached.get('next')
+        elif not 200 <= response.status < 300:
+            # http.client does not follow redirects, eg. for a renamed repo, so treat them as errors
+            # rather than parsing the redirect body as the response
+            raise Exception(f'GitHub API error {response.status} for {method} {url}: {data.decode("utf-8")}')
+        elif method == 'GET' and response.getheader('ETag') != None:
+            with self.lock:
+                try:
+                    with shelve.open(ETAG_CACHE) as cache:
+                        cache[url]={'etag': response.getheader('ETag'), 'body': data, 'next': next_url}
+                except dbm.error:
+                    pass
+        return (json.loads(data) if data else None), next_url
+
+    def gh_api(self, path: str, method='GET', /, **fields):
+        return self.request(method, self.base_path+path, fields or None)
+
+    def gh_api_list(self, path: str):
+        # list endpoints return 30 items by default, so ask for the maximum and follow the next links
+        items=[]
+        url=self.base_path+path+'?per_page=100'
+        while url != None:
+            page, url=self.send('GET', url)
+            items.extend(page)
+        return items
+
+    def graphql(self, query: str, **variables):
+        result=self.request('POST', '/graphql', {'query': query, 'variables': variables})
+        if result.get('errors'):
+            raise Exception(f"GitHub GraphQL error: {result['errors'][0]['message']}")
+        return result['data']
+
+    def iter_pr_comments(self, pr: int):
+        comments=self.iter_graphql_comments(pr)
+        try:
+            first=next(comments)
+        except StopIteration:
+            return
+        except Exception:
+            # fall back to the rest api, which returns the same fields and more
+            # only possible before anything is yielded, so a later page failing still raises
+            yield from self.gh_api_list(f'pulls/{pr}/comments')
+            return
+        yield first
+        yield from comments
+
+    def iter_graphql_comments(self, pr: int):
+        # only ask for the fields we use, then flatten into the same shape as the rest api
+        # pages are yielded as they arrive so callers can start before the last one is fetched
+        cursor=None
+        while True:
+            data=self.graphql(REVIEW_COMMENTS_QUERY, owner=self.org, repo=self.repo, pr=pr, cursor=cursor)
+            threads=data['repository']['pullRequest']['reviewThreads']
+            for thread in threads['nodes']:
+                comments=thread['comments']
+                while True:
+                    for node in comments['nodes']:
+                        comment={'id': node['databaseId'], 'body': node['body'], 'path': node['path'], 'line': node['line']}
+                        if node['replyTo'] != None:
+                            comment['in_reply_to_id']=node['replyTo']['databaseId']
+                        yield comment
+                    if not comments['pageInfo']['hasNextPage']:
+                        break
+                    # long threads are paged on their own
+                    comments=self.graphql(THREAD_COMMENTS_QUERY, id=thread['id'], cursor=comments['pageInfo']['endCursor'])['node']['comments']
+            if not threads['pageInfo']['hasNextPage']:
+                return
+            cursor=threads['pageInfo']['endCursor']
+
+    @functools.lru_cache(maxsize=8)
+    def get_pr(self, pr: int):
+        return self.gh_api(f'pulls/{pr}')
+
+    @functools.lru_cache(maxsize=8)
+    def list_pr_comments(self, pr: int):
+        return sorted(self.iter_pr_comments(pr), key=lambda comment: comment['id'])
+
+
+def get_pr_from_branch(api: GHApi):
+    # ask the api directly rather than going through `gh pr list`
+    import urllib.parse
+
+    try:
+        branch = read_command(['git', 'symbolic-ref', '--short', 'HEAD'])
+    except subprocess.CalledProcessError:
+        # detached HEAD, so there is no branch to look up
+        return None
+    head = urllib.parse.quote(f'{api.org}:{branch}')
+    pulls = api.gh_api(f'pulls?head={head}&state=open&per_page=1')
+    return pulls[0]['number'] if pulls else None
+
+
+def open_editor(content: str):
+    # let the user edit content in $VISUAL/$EDITOR via a temp file, writing and reading it with one call each
+    import shlex
+    import tempfile
+
+    fd, path = tempfile.mkstemp(suffix='.md')
+    try:
+        os.write(fd, content.encode('utf-8'))
+        os.close(fd)
+        editor = os.environ.get('VISUAL') or os.environ.get('EDITOR') or 'vi'
+        subprocess.run([*shlex.split(editor), path], check=True)
+        with open(path, 'rb') as file:
+            return file.read().decode('utf-8', errors='replace').rstrip('\n')
+    finally:
+        os.unlink(path)
+
+
+def parse_line_range(text: str):
+    # a single line, eg. 5, or a range of lines, eg. 5-12 OR 5:12
+    match = LINE_RANGE_PATTERN.match(text)
+    if match == None:
+        raise Exception(f'Cannot parse line {text}, expected eg. 5, 5-12 or 5:12')
+    start = int(match.group(1))
+    end = int(match.group(2)) if match.group(2) != None else start
+    # lines start at 1 and a range must not run backwards
+    if start < 1 or start > end:
+        raise Exception(f'Cannot parse line {text}, expected eg. 5, 5-12 or 5:12')
+    return start, end
+
+
+def quote_reply(body: str):
+    # prefix every line of a thread reply, not just the first
+    return '> ' + body.replace('\n', '\n> ')
+
+
+def render_threads(top_comments: list, replies: dict):
+    # yield one thread at a time so output can start before every thread is formatted
+    for comment in top_comments:
+        yield f"{comment['body']}\n" + ''.join(f"{quote_reply(thread_comment['body'])}\n" for thread_comment in replies.get(comment['id'], []))
+
+
+def page(chunks):
+    # stream through $PAGER on a terminal like git and gh do, otherwise write straight to stdout
+    if not sys.stdout.isatty():
+        for chunk in chunks:
+            sys.stdout.write(chunk)
+        return
+
+    import shlex
 
-    def gh_api(self, path: str, method='GET', *args):
-        return subprocess.check_output([
-            'gh', 'api',
-            '--method', method,
-            *self.headers,
-            f'/repos/{self.org}/{self.repo}/'+path,
-            *args,
-        ]).decode('utf-8').strip()
+    sys.stdout.flush()
+    try:
+        pager = subprocess.Popen(shlex.split(os.environ.get('PAGER') or 'less -FRX'), stdin=subprocess.PIPE, text=True)
+    except FileNotFoundError:
+        for chunk in chunks:
+            sys.stdout.write(chunk)
+        return
 
+    try:
+        for chunk in chunks:
+            pager.stdin.write(chunk)
+    except BrokenPipeError:
+        # the pager was quit before reading everything
+        pass
+    finally:
+        # always hand the terminal back, even when building the output failed part way
+        try:
+            pager.stdin.close()
+        except BrokenPipeError:
+            pass
+        pager.wait()
+
+
+def handle_review_comment(api: GHApi, args):
+    # pull request file level comments, or file AND line level comments when a line is given
+    if args.line != None:
+        start_line, line = parse_line_range(args.line)
+
+    if not args.view and not args.edit:
+        import concurrent.futures
+
+        # fetch the head commit for a new thread alongside the comments and while the user answers the prompts
+        executor = concurrent.futures.ThreadPoolExecutor(1)
+        head_future = executor.submit(lambda: api.get_pr(args.pr)['head']['sha'])
+        executor.shutdown(wait=False)
+
+    # one pass to pick out the top level comments, with thread replies indexed by the comment they reply to
+    top_comments = []
+    replies = {}
+    for comment in api.list_pr_comments(args.pr):
+        if comment['path'] != args.file:
+            continue
+        if 'in_reply_to_id' in comment:
+            replies.setdefault(comment['in_reply_to_id'], []).append(comment)
+        elif args.line == None or comment.get('line') == line:
+            top_comments.append(comment)
+
+    latest_comment = top_comments[-1] if top_comments else None
+
+    if args.view:
+        if latest_comment == None:
+            if args.line == None:
+                print('No comments on file', args.file)
+            else:
+                print('No comments on line', args.line, 'in file', args.file)
+        else:
+            page(render_threads(top_comments, replies))
+        return
+
+    if args.edit:
+        # TODO implement edit
+        raise Exception('Not implemented yet, exiting.')
+
+    if latest_comment != None:
+        latest_comment_id = latest_comment.get('id', None)
+        sys.stdout.write(''.join(render_threads([latest_comment], replies)))
+
+        if input("Continue the existing thread? (Y/n): ") in ['Y', 'y']:
+            api.gh_api(
+                f'pulls/{args.pr}/comments/{latest_comment_id}/replies',
+                'POST',
+                body=args.comment,
+            )
+            return
+
+        if input("Create new thread? (Y/n): ") not in ['Y', 'y']:
+            return
+
+    if args.line == None:
+        position = {'subject_type': 'file'}
+    elif start_line == line:
+        position = {'line': line}
+    else:
+        position = {'start_line': start_line, 'start_side': 'RIGHT', 'line': line}
+
+    head=head_future.result()
+    api.gh_api(
+        f'pulls/{args.pr}/comments',
+        'POST',
+        body=args.comment,
+        commit_id=head,
+        path=args.file,
+        side='RIGHT',
+        **position,
+    )
+
+
+def build_parser():
+    # argparse is only imported when parse_args needs help or error reporting
+    import argparse
 
-def main():
-    # parse the arguments
     parser = argparse.ArgumentParser(description='Tool for viewing/editing/creating pull request comments and approving')
-    parser.add_argument('-p', '--pr', type=int, help='The number of the pull request to open')
+    parser.add_argument('-p', '--pr', type=int, help='The number of the pull request to open (defaults to the open pull request for the current branch)')
     parser.add_argument('-F', '--file', type=str, help='(optional) The path to a specific file for action (e.g., path/to/file.md)')
-    parser.add_argument('-l', '--line', type=str, help='(optional) Starting line of file for action')
+    parser.add_argument('-l', '--line', type=str, help='(optional) Line or range of lines of file for action (e.g., 5, 5-12 or 5:12)')
 
     # TODO convert these flags into operations???
     parser.add_argument('-c', '--comment', type=str, help='Action: Rich text comment')
     parser.add_argument('-v', '--view', default=False, help='Action: View only mode', action=argparse.BooleanOptionalAction)
     parser.add_argument('-e', '--edit', default=False, help='Action: Edit mode', action=argparse.BooleanOptionalAction)
     parser.add_argument('-a', '--approve', default=False, help='Action: Approve mode', action=argparse.BooleanOptionalAction)
+    return parser
+
+
+def parse_args(argv: list):
+    # fast path for the plain flags, anything else (help, abbreviations, --flag=value, errors) goes to argparse
+    args = {'pr': None, 'file': None, 'line': None, 'comment': None, 'view': False, 'edit': False, 'approve': False}
+    tokens = iter(argv)
+    for token in tokens:
+        if token in SWITCHES:
+            name, value = SWITCHES[token]
+            args[name] = value
+        elif token in OPTIONS:
+            value = next(tokens, None)
+            if value == None or value.startswith('-'):
+                return build_parser().parse_args(argv)
+            args[OPTIONS[token]] = value
+        else:
+            return build_parser().parse_args(argv)
 
-    args = parser.parse_args()
+    if args['pr'] != None:
+        try:
+            args['pr'] = int(args['pr'])
+        except ValueError:
+            return build_parser().parse_args(argv)
+    return types.SimpleNamespace(**args)
 
 
-    # make sure pr is set
-    if args.pr == None:
-        # TODO use branch to get any available prs
-        raise Exception("Error: No pr number provided.")
-    else:
-        try:
-            subprocess.check_output(['gh', 'pr', 'view', str(args.pr)])
-        except:
-            return
+def main():
+    # parse the arguments
+    args = parse_args(sys.argv[1:])
 
 
     # ensure one of view, edit, approve, approve and comment, or comment is set
+    for first, second in EXCLUSIVE_ARGS:
+        if getattr(args, first) not in [None, False] and getattr(args, second) not in [None, False]:
+            raise Exception(f'Cannot set both {first} and {second}.')
+
     if args.view:
-        if args.comment != None:
-            raise Exception('Cannot set both view and comment.')
-        if args.edit:
-            raise Exception('Cannot set both view and edit modes.')
-        if args.approve:
-            raise Exception('Cannot set both view and approve modes.')
         print('Entered view only mode...')
     elif args.edit:
-        if args.comment != None:
-            raise Exception('Cannot set both edit and comment.')
-        if args.approve:
-            raise Exception('Cannot set both edit and approve modes.')
         print('Entered edit mode...')
     elif args.approve:
-        if args.comment == None:
-            try:
-                subprocess.check_output(['gh', 'pr', 'review', str(args.pr), '--approve'])
-            except:
-                return
-        else:
-            try:
-                subprocess.check_output(['gh', 'pr', 'review', str(args.pr), '--approve', '--body', args.comment])
-            except:
-                return
-        return
+        # without a pr number gh reviews the pr for the current branch itself
+        command = ['gh', 'pr', 'review', '--approve']
+        if args.pr != None:
+            command.insert(3, str(args.pr))
+        if args.comment != None:
+            command += ['--body', args.comment]
+        # nothing is left to do here, so hand the process over to gh and let its exit code through
+        sys.stdout.flush()
+        os.execvp(command[0], command)
     elif args.comment == None:
         raise Exception("Error: No mode (view/edit/approve/comment) provided.")
 
@@ -93,6 +502,12 @@ def main():
     # load the org and repo for gh api calls
     api = GHApi()
 
+    # make sure pr is set, falling back to the open pr for the current branch
+    if args.pr == None:
+        args.pr = get_pr_from_branch(api)
+        if args.pr == None:
+            raise Exception("Error: No pr number provided and no open pr found for the current branch.")
+
 
     if args.file == None:
         # pull request level comments (no threads here)
@@ -100,155 +515,44 @@ def main():
             raise Exception("No file path provided but line number provided, exiting...")
 
         # TODO handle selecting from existing pr level comments and then editing (stretch), fzf???
-        pr_comments = json.loads(api.gh_api(f'pulls/{args.pr}/comments'))
-
-        # TODO filter out non-pr level comments, eg. comments on a specific file
-        pr_comments = [comment for comment in pr_comments if 'in_reply_to_id' not in comment]
-
         if args.view:
-            for comment in pr_comments:
-                print(comment['body'])
+            # stream straight from the api, showing each page as it arrives
+            page(f"{comment['body']}\n" for comment in api.iter_pr_comments(args.pr) if 'in_reply_to_id' not in comment)
             return
 
-        if pr_comments:
-            latest_comment=pr_comments[-1]
+        # TODO filter out non-pr level comments, eg. comments on a specific file
+        # walk back from the newest comment, stopping at the first top level one
+        latest_comment = next((comment for comment in reversed(api.list_pr_comments(args.pr)) if 'in_reply_to_id' not in comment), None)
+
+        if latest_comment != None:
             latest_comment_id = latest_comment.get('id', None)
             print("Existing comment found for this pull request.")
             old_body = latest_comment.get('body', None)
             print(old_body)
 
             if args.edit:
-                # TODO make this editable using vim, nano, or other
-                new_body = input("Press Enter when you're done editing... ")
+                new_body = open_editor(old_body)
                 if new_body == '':
                     raise Exception("Empty comment, exiting...")
 
                 if old_body == new_body:
                     raise Exception("No changes, exiting...")
 
-                api.gh_api(f'pulls/comments/{latest_comment_id}', 'PATCH', '-f', f"body={new_body}")
+                api.gh_api(f'pulls/comments/{latest_comment_id}', 'PATCH', body=new_body)
                 return
         else:
             if args.edit:
                 raise Exception('No comment to edit, exiting...')
 
         print("Using comment from input...")
-        subprocess.check_output(['gh', 'pr', 'comment', str(args.pr), '--body', args.comment]).decode('utf-8').strip()
+        subprocess.run(['gh', 'pr', 'comment', str(args.pr), '--body', args.comment], check=True, stdout=subprocess.DEVNULL, env=api.env, timeout=gh_timeout())
         return
 
 
     # TODO resolve file / file and line level review comments???
 
 
-    pr_file_comments = json.loads(api.gh_api(f'pulls/{args.pr}/comments'))
-    pr_file_comments = [comment for comment in pr_file_comments if comment['path'] == args.file]
-    if args.line == None:
-        # pull request file level comments
-        latest_comment = None
-        for comment in pr_file_comments:
-            if 'in_reply_to_id' not in comment:
-                latest_comment = comment
-                if args.view:
-                    print(comment['body'])
-                    comment_thread = [comment for comment in pr_file_comments if 'in_reply_to_id' in comment and comment['in_reply_to_id'] == latest_comment['id']]
-                    for thread_comment in comment_thread:
-                        print('>', thread_comment['body'])
-
-
-        if args.view:
-            if latest_comment == None:
-                print('No comments on file', args.file)
-            return
-
-        if args.edit:
-            # TODO implement edit
-            raise Exception('Not implemented yet, exiting.')
-
-        if latest_comment != None:
-            latest_comment_id = latest_comment.get('id', None)
-            lastest_comment_thread = [comment for comment in pr_file_comments if 'in_reply_to_id' in comment and comment['in_reply_to_id'] == latest_comment['id']]
-
-            print(latest_comment['body'])
-            for thread_comment in lastest_comment_thread:
-                print('>', thread_comment['body'])
-
-            if input("Continue the existing thread? (Y/n): ") in ['Y', 'y']:
-                api.gh_api(
-                    f'pulls/{args.pr}/comments/{latest_comment["id"]}/replies',
-                    'POST',
-                    '-f' f"body={args.comment}"
-                )
-                return
-
-            if input("Create new thread? (Y/n): ") not in ['Y', 'y']:
-                return
-
-        head=json.loads(api.gh_api(f'pulls/{args.pr}'))['head']['sha']
-        api.gh_api(
-            f'pulls/{args.pr}/comments',
-            'POST',
-            '-f', f"body={args.comment}",
-            '-f', f"commit_id={head}",
-            '-f', f"path={args.file}",
-            '-f', "side=RIGHT",
-            '-f', "subject_type=file",
-        )
-        return
-    else:
-        # TODO multiline, eg. --multiline 5-12 OR --multiline 5:12
-            # '-F', "start_line=1", '-f', "start_side=RIGHT"
-        # pull request file AND line level comments
-        pr_file_and_line_comments = [comment for comment in pr_file_comments if 'line' in comment and str(comment['line']) == args.line]
-
-        latest_comment = None
-        for comment in pr_file_and_line_comments:
-            if 'in_reply_to_id' not in comment:
-                latest_comment = comment
-                if args.view:
-                    print(comment['body'])
-                    comment_thread = [comment for comment in pr_file_comments if 'in_reply_to_id' in comment and comment['in_reply_to_id'] == latest_comment['id']]
-                    for thread_comment in comment_thread:
-                        print('>', thread_comment['body'])
-
-        if args.view:
-            if latest_comment == None:
-                print('No comments on line', args.line, 'in file', args.file)
-            return
-
-        if args.edit:
-            # TODO implement edit
-            raise Exception('Not implemented yet, exiting.')
-
-        if latest_comment != None:
-            latest_comment_id = latest_comment.get('id', None)
-            lastest_comment_thread = [comment for comment in pr_file_comments if 'in_reply_to_id' in comment and comment['in_reply_to_id'] == latest_comment['id']]
-
-            print(latest_comment['body'])
-            for thread_comment in lastest_comment_thread:
-                print('>', thread_comment['body'])
-
-            if input("Continue the existing thread? (Y/n): ") in ['Y', 'y']:
-                api.gh_api(
-                    f'pulls/{args.pr}/comments/{latest_comment["id"]}/replies',
-                    'POST',
-                    '-f' f"body={args.comment}"
-                )
-                return
-
-            if input("Create new thread? (Y/n): ") not in ['Y', 'y']:
-                return
-
-        head=json.loads(api.gh_api(f'pulls/{args.pr}'))['head']['sha']
-        api.gh_api(
-            f'pulls/{args.pr}/comments',
-            'POST',
-            '-f', f"body={args.comment}",
-            '-f', f"commit_id={head}",
-            '-f', f"path={args.file}",
-            '-F', f"line={args.line}",
-            '-f', "side=RIGHT",
-        )
-        return
+    handle_review_comment(api, args)
 
 
     # TODO interactive editor for commenting